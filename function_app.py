@@ -4,20 +4,196 @@ Exposes GitHub Copilot CLI as REST API endpoints.
 """
 
 import azure.functions as func
+import asyncio
+import hashlib
 import logging
-import json
+import os
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional
+
+import orjson
 
 from services.copilot_service import CopilotService
 from services.auth_service import AuthService
 
+logger = logging.getLogger(__name__)
+
 # Initialize the Function App with Anonymous auth (our AuthService handles API key validation)
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
-# Initialize services
+
+# Initialize services (cheap: env reads only; the CLI probe stays lazy)
 copilot_service = CopilotService()
 auth_service = AuthService()
 
 
+# Cached Copilot CLI probe as (monotonic timestamp, status), shared for the
+# lifetime of the worker so /health doesn't spawn the CLI on every hit
+_COPILOT_PROBE_TTL = 30
+_copilot_probe: Optional[tuple[float, Dict[str, Any]]] = None
+_copilot_probe_lock = asyncio.Lock()
+
+
+def _fresh_copilot_probe() -> Optional[Dict[str, Any]]:
+    """Return the cached Copilot CLI status if it is still within the TTL."""
+    if _copilot_probe is not None and time.monotonic() - _copilot_probe[0] < _COPILOT_PROBE_TTL:
+        return _copilot_probe[1]
+    return None
+
+
+async def _check_copilot_cached() -> Dict[str, Any]:
+    """Return the Copilot CLI status, re-probing at most once per TTL."""
+    global _copilot_probe
+    
+    copilot_status = _fresh_copilot_probe()
+    if copilot_status is not None:
+        return copilot_status
+    
+    # Only one caller re-probes on expiry; the rest wait and reuse its result
+    async with _copilot_probe_lock:
+        copilot_status = _fresh_copilot_probe()
+        if copilot_status is None:
+            copilot_status = await copilot_service.check_copilot_available()
+            _copilot_probe = (time.monotonic(), copilot_status)
+    return copilot_status
+
+
+# Serialized /models response as (monotonic timestamp, body, ETag); the model
+# list rarely changes, so it is re-encoded at most once per TTL
+_MODELS_TTL = 300
+_models_cache: tuple[float, bytes, str] = (0.0, b"", "")
+
+
+def _get_models_response() -> tuple[bytes, str]:
+    """Return the cached /models body and its ETag, rebuilding them once per TTL."""
+    global _models_cache
+    
+    now = time.monotonic()
+    if _models_cache[1] and now - _models_cache[0] < _MODELS_TTL:
+        return _models_cache[1], _models_cache[2]
+    
+    body = orjson.dumps({"models": _models_list()})
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    _models_cache = (now, body, etag)
+    return body, etag
+
+
+# Opt-in (COPILOT_COALESCE_CHAT=true): identical concurrent chat requests share
+# one Copilot CLI run, and so one sampled completion, response ID and set of tool
+# side effects. Off by default since callers may expect independent completions.
+_COALESCE_CHAT = os.getenv("COPILOT_COALESCE_CHAT", "").lower() in ("1", "true")
+
+# In-flight chat calls keyed by (model, messages), used when _COALESCE_CHAT is set
+_chat_inflight: Dict[bytes, "asyncio.Future[bytes]"] = {}
+
+
+async def _chat_coalesced(messages: List[Dict[str, str]], model: Optional[str]) -> bytes:
+    """Run a chat request, joining an identical one already in flight, and return the JSON body."""
+    model = model or copilot_service.default_model
+    key = orjson.dumps([model, messages])
+    
+    task = _chat_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_chat(messages=messages, model=model))
+        _chat_inflight[key] = task
+        task.add_done_callback(lambda _: _chat_inflight.pop(key, None))
+    
+    # Shield so one client disconnecting doesn't cancel the run for the others
+    return await asyncio.shield(task)
+
+
+# Service methods used on the request path, bound once at import
+_validate = auth_service.validate_token
+_chat = copilot_service.chat_raw
+_stream = copilot_service.stream_chat
+_models_list = copilot_service.get_available_models
+
+
+# Static response bodies and headers, built once at import time
+_UNAUTH_BODY = b'{"error":"Unauthorized"}'
+_NO_MSG_BODY = b'{"error":"Messages are required"}'
+_BAD_JSON_BODY = b'{"error":"Invalid JSON in request body"}'
+_HEALTH_HEADERS = MappingProxyType({"Cache-Control": f"max-age={_COPILOT_PROBE_TTL}"})
+_SSE_HEADERS = MappingProxyType({
+    "Cache-Control": "no-cache, no-transform",
+    "X-Accel-Buffering": "no"
+})
+
+
+def _json_response(
+    body: bytes,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None
+) -> func.HttpResponse:
+    """Build an application/json response from an already-encoded body."""
+    return func.HttpResponse(
+        body,
+        status_code=status_code,
+        mimetype="application/json",
+        headers=headers
+    )
+
+
+class RequestError(Exception):
+    """A client error answered with a precomputed JSON body."""
+    
+    def __init__(self, body: bytes, status_code: int):
+        super().__init__(body)
+        self.body = body
+        self.status_code = status_code
+    
+    @property
+    def response(self) -> func.HttpResponse:
+        """The HTTP response for this error."""
+        return _json_response(self.body, self.status_code)
+
+
+class AuthError(RequestError):
+    """Missing or invalid Authorization header."""
+    
+    def __init__(self):
+        super().__init__(_UNAUTH_BODY, 401)
+
+
+class BadRequest(RequestError):
+    """Malformed or incomplete request body."""
+    
+    def __init__(self, body: bytes):
+        super().__init__(body, 400)
+
+
+async def _authorize(req: func.HttpRequest):
+    """Validate the request's Authorization header, raising AuthError if rejected."""
+    if not await _validate(req.headers.get("Authorization")):
+        raise AuthError()
+
+
+async def _parse_authed(req: func.HttpRequest) -> tuple[List[Dict[str, str]], Optional[str]]:
+    """
+    Authorize a chat request and parse its body.
+    
+    Returns:
+        Tuple of (messages, model)
+    
+    Raises:
+        AuthError: If the Authorization header is rejected
+        BadRequest: If the body is not valid JSON or has no messages
+    """
+    await _authorize(req)
+    
+    try:
+        req_body = orjson.loads(req.get_body())
+    except orjson.JSONDecodeError:
+        raise BadRequest(_BAD_JSON_BODY)
+    
+    messages = req_body.get("messages", [])
+    if not messages:
+        raise BadRequest(_NO_MSG_BODY)
+    
+    return messages, req_body.get("model")
+
+
 @app.route(route="chat", methods=["POST"])
 async def chat(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -48,54 +224,27 @@ async def chat(req: func.HttpRequest) -> func.HttpResponse:
         ]
     }
     """
-    logging.info("Chat endpoint called")
+    logger.debug("Chat endpoint called")
     
     try:
-        # Validate authentication
-        auth_header = req.headers.get("Authorization")
-        if not auth_service.validate_token(auth_header):
-            return func.HttpResponse(
-                json.dumps({"error": "Unauthorized"}),
-                status_code=401,
-                mimetype="application/json"
-            )
-        
-        # Parse request body
-        req_body = req.get_json()
-        messages = req_body.get("messages", [])
-        model = req_body.get("model")
-        
-        if not messages:
-            return func.HttpResponse(
-                json.dumps({"error": "Messages are required"}),
-                status_code=400,
-                mimetype="application/json"
-            )
+        # Validate authentication and parse request body
+        messages, model = await _parse_authed(req)
         
         # Call copilot service
-        response = await copilot_service.chat(
-            messages=messages,
-            model=model
-        )
+        if _COALESCE_CHAT:
+            response_body = await _chat_coalesced(messages, model)
+        else:
+            response_body = await _chat(messages=messages, model=model)
         
-        return func.HttpResponse(
-            json.dumps(response),
-            status_code=200,
-            mimetype="application/json"
-        )
+        return _json_response(response_body)
         
-    except json.JSONDecodeError:
-        return func.HttpResponse(
-            json.dumps({"error": "Invalid JSON in request body"}),
-            status_code=400,
-            mimetype="application/json"
-        )
+    except RequestError as e:
+        return e.response
     except Exception as e:
-        logging.error(f"Error in chat endpoint: {str(e)}")
-        return func.HttpResponse(
-            json.dumps({"error": "Internal server error", "details": str(e)}),
-            status_code=500,
-            mimetype="application/json"
+        logger.error("Error in chat endpoint: %s", e)
+        return _json_response(
+            orjson.dumps({"error": "Internal server error", "details": str(e)}),
+            500
         )
 
 
@@ -105,7 +254,7 @@ async def stream(req: func.HttpRequest) -> func.HttpResponse:
     POST /api/stream
     
     Streaming chat endpoint using Server-Sent Events (SSE).
-    Note: Simulated streaming since CLI doesn't support native streaming.
+    The frames are returned in one body once the Copilot CLI finishes.
     
     Request Body:
     {
@@ -117,59 +266,34 @@ async def stream(req: func.HttpRequest) -> func.HttpResponse:
     
     Response: Server-Sent Events stream
     """
-    logging.info("Stream endpoint called")
+    logger.debug("Stream endpoint called")
     
     try:
-        # Validate authentication
-        auth_header = req.headers.get("Authorization")
-        if not auth_service.validate_token(auth_header):
-            return func.HttpResponse(
-                json.dumps({"error": "Unauthorized"}),
-                status_code=401,
-                mimetype="application/json"
-            )
+        # Validate authentication and parse request body
+        messages, model = await _parse_authed(req)
         
-        # Parse request body
-        req_body = req.get_json()
-        messages = req_body.get("messages", [])
-        model = req_body.get("model")
-        
-        if not messages:
-            return func.HttpResponse(
-                json.dumps({"error": "Messages are required"}),
-                status_code=400,
-                mimetype="application/json"
+        # Collect the SSE frames: func.HttpResponse only accepts a complete body
+        stream_content = b"".join([
+            frame async for frame in _stream(
+                messages=messages,
+                model=model
             )
-        
-        # Get streaming response (returns tuple of stream_content and files)
-        stream_content, files = await copilot_service.stream_chat(
-            messages=messages,
-            model=model
-        )
+        ])
         
         return func.HttpResponse(
             stream_content,
             status_code=200,
             mimetype="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"
-            }
+            headers=_SSE_HEADERS
         )
         
-    except json.JSONDecodeError:
-        return func.HttpResponse(
-            json.dumps({"error": "Invalid JSON in request body"}),
-            status_code=400,
-            mimetype="application/json"
-        )
+    except RequestError as e:
+        return e.response
     except Exception as e:
-        logging.error(f"Error in stream endpoint: {str(e)}")
-        return func.HttpResponse(
-            json.dumps({"error": "Internal server error", "details": str(e)}),
-            status_code=500,
-            mimetype="application/json"
+        logger.error("Error in stream endpoint: %s", e)
+        return _json_response(
+            orjson.dumps({"error": "Internal server error", "details": str(e)}),
+            500
         )
 
 
@@ -180,19 +304,19 @@ async def health(req: func.HttpRequest) -> func.HttpResponse:
     
     Health check endpoint - also checks Copilot CLI availability.
     """
-    copilot_status = await copilot_service.check_copilot_available()
+    copilot_status = await _check_copilot_cached()
     
     status = "healthy" if copilot_status.get("available") else "degraded"
     
-    return func.HttpResponse(
-        json.dumps({
+    return _json_response(
+        orjson.dumps({
             "status": status,
             "service": "github-copilot-api",
             "version": "2.0.0",
             "copilot": copilot_status
         }),
-        status_code=200 if status == "healthy" else 503,
-        mimetype="application/json"
+        200 if status == "healthy" else 503,
+        _HEALTH_HEADERS
     )
 
 
@@ -203,29 +327,21 @@ async def models(req: func.HttpRequest) -> func.HttpResponse:
     
     List available models from Copilot CLI.
     """
-    logging.info("Models endpoint called")
+    logger.debug("Models endpoint called")
     
     try:
-        auth_header = req.headers.get("Authorization")
-        if not auth_service.validate_token(auth_header):
-            return func.HttpResponse(
-                json.dumps({"error": "Unauthorized"}),
-                status_code=401,
-                mimetype="application/json"
-            )
+        await _authorize(req)
         
-        available_models = copilot_service.get_available_models()
+        body, etag = _get_models_response()
         
-        return func.HttpResponse(
-            json.dumps({"models": available_models}),
-            status_code=200,
-            mimetype="application/json"
-        )
+        # Client already has this exact list
+        if req.headers.get("If-None-Match") == etag:
+            return func.HttpResponse(status_code=304, headers={"ETag": etag})
+        
+        return _json_response(body, headers={"ETag": etag})
         
+    except RequestError as e:
+        return e.response
     except Exception as e:
-        logging.error(f"Error in models endpoint: {str(e)}")
-        return func.HttpResponse(
-            json.dumps({"error": str(e)}),
-            status_code=500,
-            mimetype="application/json"
-        )
+        logger.error("Error in models endpoint: %s", e)
+        return _json_response(orjson.dumps({"error": str(e)}), 500)
@@ -1,24 +1,110 @@
 """
 Authentication Service - Simple API key validation.
+
+When REDIS_URL is set, validated tokens and revocations are shared across
+instances through Redis; otherwise only the static API_KEY is checked.
 """
 
 import os
+import hmac
+import hashlib
 import logging
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Accepted Authorization header prefixes (scheme + space), all of _PREFIX_LEN
+_PREFIX_LEN = 7
+_PREFIXES = frozenset({b"Bearer ", b"ApiKey "})
+
+# Headers that passed validation, with the key they matched (bounded)
+_VALID_CACHE_SIZE = 16
+_valid_headers: Set[Tuple[str, bytes]] = set()
+
+# How long a validated token stays cached in Redis (seconds)
+_TOKEN_TTL = 300
+
+# Connect/read timeout for Redis calls (seconds); on timeout the static check is used
+_REDIS_TIMEOUT = 0.5
+
+
+def _strip_prefix(auth_header: str) -> bytes:
+    """Return the token bytes from an Authorization header, minus any Bearer / ApiKey prefix."""
+    token = auth_header.encode("utf-8")
+    if token[:_PREFIX_LEN] in _PREFIXES:
+        return token[_PREFIX_LEN:]
+    return token
+
+
+def _token_key(token: bytes, api_key: bytes) -> str:
+    """
+    Redis key for a token; only hashes are ever stored.
+    
+    Namespaced by a fingerprint of the API key, so entries written under a
+    different (or rotated) key are never consulted.
+    """
+    key_id = hashlib.sha256(api_key).hexdigest()[:16]
+    return f"tok:{key_id}:{hashlib.sha256(token).hexdigest()}"
+
+
+def _validate_cached(auth_header: str, api_key: bytes) -> bool:
+    """
+    Validate an Authorization header against the API key.
+    
+    Only successful (header, key) pairs are remembered, so junk headers can
+    neither fill the cache nor evict the valid ones.
+    """
+    if (auth_header, api_key) in _valid_headers:
+        return True
+    
+    # Longer than any prefix plus the key, so it cannot match
+    if len(auth_header) > _PREFIX_LEN + len(api_key):
+        return False
+    
+    # Constant-time comparison to avoid leaking key contents via timing
+    valid = hmac.compare_digest(_strip_prefix(auth_header), api_key)
+    if valid and len(_valid_headers) < _VALID_CACHE_SIZE:
+        _valid_headers.add((auth_header, api_key))
+    return valid
+
+
+@lru_cache(maxsize=1)
+def _get_redis(url: str) -> Any:
+    """Get the process-wide (connection-pooled) Redis client for url."""
+    import redis.asyncio as aioredis
+    
+    return aioredis.Redis.from_url(
+        url,
+        socket_connect_timeout=_REDIS_TIMEOUT,
+        socket_timeout=_REDIS_TIMEOUT
+    )
+
 
 class AuthService:
     """
     Simple authentication service for API key validation.
+    
+    In dev mode (no API_KEY) validate_token is rebound on the instance to
+    _always_ok, so unauthenticated requests skip all header work.
     """
     
     def __init__(self):
         """Initialize the auth service."""
-        self._api_key = os.getenv("API_KEY", "")
+        self._api_key = os.getenv("API_KEY", "").encode("utf-8")
+        self._redis_url = os.getenv("REDIS_URL", "")
+        
+        # Dev mode: specialize validate_token to always allow
+        if not self._api_key:
+            logger.warning("No API_KEY configured - allowing unauthenticated access")
+            self.validate_token = self._always_ok
     
-    def validate_token(self, auth_header: Optional[str]) -> bool:
+    @staticmethod
+    async def _always_ok(auth_header: Optional[str]) -> bool:
+        """Dev-mode validator: no API key is configured, so allow every request."""
+        return True
+    
+    async def validate_token(self, auth_header: Optional[str]) -> bool:
         """
         Validate the authorization header.
         
@@ -28,23 +114,48 @@ class AuthService:
         Returns:
             True if valid, False otherwise
         """
-        # If no API key is configured, allow all requests (dev mode)
-        if not self._api_key:
-            logger.warning("No API_KEY configured - allowing unauthenticated access")
-            return True
-        
         if not auth_header:
             return False
         
-        # Check for Bearer token
-        if auth_header.startswith("Bearer "):
-            token = auth_header[7:]
-            return token == self._api_key
+        if not self._redis_url:
+            return _validate_cached(auth_header, self._api_key)
         
-        # Check for ApiKey prefix
-        if auth_header.startswith("ApiKey "):
-            key = auth_header[7:]
-            return key == self._api_key
+        return await self._validate_shared(auth_header, self._api_key)
+    
+    async def _validate_shared(self, auth_header: str, api_key: bytes) -> bool:
+        """
+        Validate against the shared Redis token cache.
+        
+        A cached b"1" is valid and b"0" is revoked; on a miss the static key
+        is checked and a valid token is cached for _TOKEN_TTL seconds.
+        Redis errors fall back to the static check.
+        """
+        redis = _get_redis(self._redis_url)
+        key = _token_key(_strip_prefix(auth_header), api_key)
+        
+        try:
+            state = await redis.get(key)
+        except Exception as e:
+            logger.warning("Redis token lookup failed, using static key: %s", e)
+            return _validate_cached(auth_header, api_key)
+        
+        if state == b"0":
+            return False
+        if state == b"1":
+            return True
+        
+        valid = _validate_cached(auth_header, api_key)
+        if valid:
+            try:
+                await redis.set(key, b"1", ex=_TOKEN_TTL, nx=True)
+            except Exception as e:
+                logger.warning("Failed to cache token in Redis: %s", e)
+        return valid
+    
+    async def revoke_token(self, token: str):
+        """Blacklist a token for all instances sharing the Redis cache."""
+        if not self._redis_url:
+            raise RuntimeError("Token revocation requires REDIS_URL to be set")
         
-        # Direct comparison
-        return auth_header == self._api_key
+        key = _token_key(token.encode("utf-8"), self._api_key)
+        await _get_redis(self._redis_url).set(key, b"0")
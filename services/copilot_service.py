@@ -20,20 +20,153 @@ Requirements:
 """
 
 import os
-import json
 import logging
 import asyncio
+import contextlib
 import re
 import time
 import tempfile
 import shutil
 import base64
-import uuid
-from pathlib import Path
-from typing import List, Dict, Any, Optional
+import codecs
+import itertools
+import mmap
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import AsyncIterator, Iterator, FrozenSet, List, Dict, Any, Optional
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Temp directory for workspaces, resolved once at import
+_TMPDIR = tempfile.gettempdir()
+
+# Shared pool for reading + base64-encoding workspace files in parallel
+_READ_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="workspace-read")
+
+# Files are read and base64-encoded in chunks of this size; a multiple of 3
+# so the per-chunk encodings concatenate without padding in between
+_READ_CHUNK_SIZE = 48 * 1024
+
+# Files larger than this are memory-mapped and encoded in one pass instead
+_MMAP_THRESHOLD = 64 * 1024
+
+# A NUL byte within this many leading bytes marks a file as binary (as git does)
+_BINARY_SNIFF_SIZE = 4096
+
+# Directories, extensions and file names skipped when scanning a workspace
+_IGNORED_DIRS = frozenset({
+    '.venv', 'venv', 'env', '.env',  # Virtual environments
+    '__pycache__', '.pytest_cache', '.mypy_cache', '.ruff_cache',  # Python caches
+    'node_modules', '.npm',  # Node.js
+    '.git', '.svn', '.hg',  # Version control
+    '.idea', '.vscode', '.vs',  # IDE folders
+    'dist', 'build', 'target', 'out',  # Build outputs
+    '.tox', '.nox', 'htmlcov', '.coverage',  # Testing
+    'egg-info', '.eggs',  # Python packaging
+})
+
+_IGNORED_EXTS = frozenset({
+    '.pyc', '.pyo', '.pyd',  # Python compiled
+    '.so', '.dll', '.dylib',  # Compiled libraries
+    '.exe', '.bin',  # Executables
+    '.log', '.tmp', '.temp',  # Temp/log files
+    '.DS_Store', '.gitignore', '.gitattributes',  # System/git files
+})
+
+_IGNORED_FILES = frozenset({
+    '.DS_Store', 'Thumbs.db', 'desktop.ini',  # OS files
+    '.env', '.env.local', '.env.development',  # Environment files (might contain secrets)
+})
+
+# MIME types by lowercased file extension
+_MIME_MAP = MappingProxyType({
+    ".py": "text/x-python",
+    ".js": "text/javascript",
+    ".ts": "text/typescript",
+    ".jsx": "text/jsx",
+    ".tsx": "text/tsx",
+    ".json": "application/json",
+    ".html": "text/html",
+    ".css": "text/css",
+    ".md": "text/markdown",
+    ".txt": "text/plain",
+    ".yaml": "text/yaml",
+    ".yml": "text/yaml",
+    ".xml": "application/xml",
+    ".sh": "text/x-shellscript",
+    ".bash": "text/x-shellscript",
+    ".ps1": "text/x-powershell",
+    ".java": "text/x-java",
+    ".c": "text/x-c",
+    ".cpp": "text/x-c++",
+    ".h": "text/x-c",
+    ".cs": "text/x-csharp",
+    ".go": "text/x-go",
+    ".rs": "text/x-rust",
+    ".rb": "text/x-ruby",
+    ".php": "text/x-php",
+    ".sql": "text/x-sql",
+    ".dockerfile": "text/x-dockerfile",
+    ".gitignore": "text/plain",
+    ".env": "text/plain",
+})
+
+# ANSI escape sequences and spinner frames stripped from CLI output
+_ANSI_ESCAPE_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+_SPINNER_CHARS = frozenset('⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏')
+
+# Tails of a chat.completion.chunk SSE frame, after the delta content
+_CHUNK_SUFFIX = b'},"finish_reason":null}]}\n\n'
+_CHUNK_STOP_SUFFIX = b'},"finish_reason":"stop"}]}\n\n'
+
+# Size of each read from the CLI's stdout while streaming
+_STREAM_READ_SIZE = 64 * 1024
+
+_CLI_NOT_FOUND_MESSAGE = (
+    "GitHub Copilot CLI not found. Please install it:\n"
+    "- Windows: winget install GitHub.Copilot\n"
+    "- macOS/Linux: brew install copilot-cli\n"
+    "- npm: npm install -g @github/copilot\n"
+    "Then set GH_TOKEN with a PAT that has 'Copilot Requests' permission"
+)
+
+
+def _walk_files(root: str, ignored_dirs: FrozenSet[str]) -> Iterator[os.DirEntry]:
+    """
+    Yield a DirEntry for every regular file under root.
+    
+    Ignored directories (plus any "*.egg-info" metadata directory) are
+    pruned before descending, so their contents are never listed. Symlinks
+    are not followed, so nothing outside root is ever read.
+    """
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    name = entry.name
+                    if name not in ignored_dirs and not name.endswith(".egg-info"):
+                        yield from _walk_files(entry.path, ignored_dirs)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+    except OSError as e:
+        logger.warning("Failed to list directory %s: %s", root, e)
+
+
+def _clean_output_line(line: str) -> Optional[str]:
+    """
+    Strip ANSI codes from one line of CLI output; None for spinner lines.
+    
+    Shared by _parse_copilot_output and the streaming reader so both clean
+    output the same way.
+    """
+    line = _ANSI_ESCAPE_RE.sub('', line)
+    if not _SPINNER_CHARS.isdisjoint(line):
+        return None
+    return line
+
 
 class CopilotService:
     """
@@ -53,20 +186,41 @@ class CopilotService:
         self._gh_token = os.getenv("GH_TOKEN", "") or os.getenv("GITHUB_TOKEN", "")
         self._default_model = os.getenv("COPILOT_MODEL", "claude-sonnet-4")
         
-    def _get_env(self) -> Dict[str, str]:
-        """Get environment variables for Copilot CLI, including auth token."""
-        env = os.environ.copy()
-        if self._gh_token:
-            env["GH_TOKEN"] = self._gh_token
-            env["GITHUB_TOKEN"] = self._gh_token
-        return env
+        # Sequential IDs for responses that have no workspace to name them after
+        self._response_ids = itertools.count()
+        
+        # CLI environment, built once: the process environment plus the auth token
+        self._env = {
+            **os.environ,
+            "GH_TOKEN": self._gh_token,
+            "GITHUB_TOKEN": self._gh_token
+        } if self._gh_token else None
+        
+        # Optional cap on concurrent CLI processes (0 = unlimited); requests
+        # beyond the cap wait for a free slot instead of oversubscribing the sandbox
+        max_processes = int(os.getenv("COPILOT_MAX_PROCESSES", "0"))
+        self._process_slots = asyncio.Semaphore(max_processes) if max_processes > 0 else None
+        
+    @property
+    def default_model(self) -> str:
+        """Model used when a request doesn't name one."""
+        return self._default_model
+    
+    def _get_env(self) -> Optional[Dict[str, str]]:
+        """
+        Get environment variables for Copilot CLI, including auth token.
+        
+        Returns None (inherit this process's environment) when no token
+        overlay is needed.
+        """
+        return self._env
     
     def _create_temp_workspace(self) -> str:
         """Create a temporary workspace directory for this request."""
-        workspace_id = str(uuid.uuid4())[:8]
-        workspace_path = os.path.join(tempfile.gettempdir(), f"copilot_workspace_{workspace_id}")
+        workspace_id = secrets.token_hex(4)
+        workspace_path = f"{_TMPDIR}{os.sep}copilot_workspace_{workspace_id}"
         os.makedirs(workspace_path, exist_ok=True)
-        logger.info(f"Created temp workspace: {workspace_path}")
+        logger.debug("Created temp workspace: %s", workspace_path)
         return workspace_path
     
     def _cleanup_workspace(self, workspace_path: str):
@@ -74,145 +228,224 @@ class CopilotService:
         try:
             if os.path.exists(workspace_path):
                 shutil.rmtree(workspace_path)
-                logger.info(f"Cleaned up workspace: {workspace_path}")
+                logger.debug("Cleaned up workspace: %s", workspace_path)
         except Exception as e:
-            logger.warning(f"Failed to cleanup workspace {workspace_path}: {e}")
+            logger.warning("Failed to cleanup workspace %s: %s", workspace_path, e)
     
-    def _scan_workspace_files(self, workspace_path: str) -> List[Dict[str, Any]]:
+    def _scan_workspace_files(
+        self,
+        workspace_path: str,
+        include_text: bool = True
+    ) -> List[Dict[str, Any]]:
         """
         Scan workspace for all files and return them with base64 content.
         Ignores virtual environments, cache files, and other common artifacts.
         
+        Args:
+            workspace_path: Workspace directory to scan
+            include_text: If False, content_text is None for every file
+            
         Returns:
             List of file info dicts with path, content (base64), size, etc.
         """
-        # Directories and patterns to ignore
-        IGNORED_DIRS = {
-            '.venv', 'venv', 'env', '.env',  # Virtual environments
-            '__pycache__', '.pytest_cache', '.mypy_cache', '.ruff_cache',  # Python caches
-            'node_modules', '.npm',  # Node.js
-            '.git', '.svn', '.hg',  # Version control
-            '.idea', '.vscode', '.vs',  # IDE folders
-            'dist', 'build', 'target', 'out',  # Build outputs
-            '.tox', '.nox', 'htmlcov', '.coverage',  # Testing
-            'egg-info', '.eggs',  # Python packaging
-        }
+        candidates = []
         
-        IGNORED_EXTENSIONS = {
-            '.pyc', '.pyo', '.pyd',  # Python compiled
-            '.so', '.dll', '.dylib',  # Compiled libraries
-            '.exe', '.bin',  # Executables
-            '.log', '.tmp', '.temp',  # Temp/log files
-            '.DS_Store', '.gitignore', '.gitattributes',  # System/git files
-        }
+        # Entry paths all start with "<workspace_path><sep>": slice it off
+        prefix_len = len(os.path.join(workspace_path, ""))
         
-        IGNORED_FILES = {
-            '.DS_Store', 'Thumbs.db', 'desktop.ini',  # OS files
-            '.env', '.env.local', '.env.development',  # Environment files (might contain secrets)
-        }
+        for entry in _walk_files(workspace_path, _IGNORED_DIRS):
+            name = entry.name
+            # Same rule as Path.suffix: a leading or trailing dot is not a suffix
+            dot = name.rfind('.')
+            extension = name[dot:].lower() if 0 < dot < len(name) - 1 else ''
+            
+            # Skip if file extension is ignored
+            if extension in _IGNORED_EXTS:
+                continue
+            
+            # Skip if filename is in ignored list
+            if name in _IGNORED_FILES:
+                continue
+            
+            # Skip hidden files (starting with .)
+            if name[0] == '.' and name not in {'.gitignore', '.dockerignore'}:
+                continue
+            
+            relative_path = entry.path[prefix_len:]
+            if os.sep != "/":
+                relative_path = relative_path.replace(os.sep, "/")
+            
+            try:
+                # Reuses the lstat result cached by scandir
+                file_size = entry.stat(follow_symlinks=False).st_size
+            except OSError as e:
+                logger.warning("Failed to read file %s: %s", entry.path, e)
+                continue
+            
+            # Skip very large files (> 1MB)
+            if file_size > 1024 * 1024:
+                logger.warning("Skipping large file: %s (%d bytes)", relative_path, file_size)
+                continue
+            
+            candidates.append((entry.path, relative_path, name, extension, file_size, include_text))
         
-        files = []
-        workspace = Path(workspace_path)
+        # Read and encode files in parallel; map() keeps the walk order
+        results = _READ_POOL.map(lambda c: self._read_and_encode(*c), candidates)
+        return [file_info for file_info in results if file_info is not None]
+    
+    def _read_and_encode(
+        self,
+        path: str,
+        relative_path: str,
+        name: str,
+        extension: str,
+        file_size: int,
+        include_text: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Read a workspace file and build its info dict with base64 content.
         
-        for file_path in workspace.rglob("*"):
-            if file_path.is_file():
-                # Check if any parent directory is in ignored list
-                relative_path = file_path.relative_to(workspace)
-                path_parts = relative_path.parts
-                
-                # Skip if any directory in path is ignored
-                if any(part in IGNORED_DIRS for part in path_parts[:-1]):
-                    continue
-                
-                # Skip if file extension is ignored
-                if file_path.suffix.lower() in IGNORED_EXTENSIONS:
-                    continue
-                
-                # Skip if filename is in ignored list
-                if file_path.name in IGNORED_FILES:
-                    continue
-                
-                # Skip hidden files (starting with .)
-                if file_path.name.startswith('.') and file_path.name not in {'.gitignore', '.dockerignore'}:
-                    continue
-                
+        Files over _MMAP_THRESHOLD are memory-mapped and encoded straight from
+        the mapping, so no copy of the raw content is made. Smaller files are
+        read in _READ_CHUNK_SIZE chunks: each chunk is base64-encoded and fed
+        to an incremental UTF-8 decoder (to detect binary files).
+        
+        Returns:
+            File info dict, or None if the file couldn't be read
+        """
+        try:
+            if file_size > _MMAP_THRESHOLD:
+                content_base64, content_text, is_binary = self._encode_mapped(path, include_text)
+            else:
+                content_base64, content_text, is_binary = self._encode_chunked(path, include_text)
+            
+            # Detect file type
+            mime_type = self._get_mime_type(extension)
+            
+            return {
+                "path": relative_path,
+                "name": name,
+                "extension": extension,
+                "size": file_size,
+                "is_binary": is_binary,
+                "mime_type": mime_type,
+                "content_base64": content_base64,
+                "content_text": content_text
+            }
+            
+        except Exception as e:
+            logger.warning("Failed to read file %s: %s", path, e)
+            return None
+    
+    @staticmethod
+    def _encode_mapped(path: str, include_text: bool) -> tuple[str, Optional[str], bool]:
+        """
+        Encode a file from a read-only memory map. A NUL byte in the first
+        _BINARY_SNIFF_SIZE bytes marks it binary without decoding it; when
+        include_text is False the UTF-8 check discards the decoded text.
+        
+        Returns:
+            Tuple of (content_base64, content_text, is_binary)
+        """
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            content_base64 = base64.b64encode(mm).decode("ascii")
+            if mm.find(b"\0", 0, _BINARY_SNIFF_SIZE) != -1:
+                return content_base64, None, True
+            
+            if include_text:
                 try:
-                    file_size = file_path.stat().st_size
-                    
-                    # Skip very large files (> 1MB)
-                    if file_size > 1024 * 1024:
-                        logger.warning(f"Skipping large file: {relative_path} ({file_size} bytes)")
-                        continue
-                    
-                    # Read content and encode as base64
-                    with open(file_path, "rb") as f:
-                        content_bytes = f.read()
-                    
-                    # Try to decode as text first
+                    return content_base64, str(mm, "utf-8"), False
+                except UnicodeDecodeError:
+                    return content_base64, None, True
+            
+            # Text not wanted: validate UTF-8 chunk by chunk without keeping it
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            try:
+                with memoryview(mm) as view:
+                    for start in range(0, len(view), _READ_CHUNK_SIZE):
+                        decoder.decode(view[start:start + _READ_CHUNK_SIZE])
+                decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                return content_base64, None, True
+        
+        return content_base64, None, False
+    
+    @staticmethod
+    def _encode_chunked(path: str, include_text: bool) -> tuple[str, Optional[str], bool]:
+        """
+        Encode a file read in _READ_CHUNK_SIZE chunks. A NUL byte in the
+        first _BINARY_SNIFF_SIZE bytes marks it binary without decoding it.
+        
+        Returns:
+            Tuple of (content_base64, content_text, is_binary)
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        base64_parts = []
+        text_parts = []
+        is_binary = False
+        
+        with open(path, "rb") as f:
+            chunk = f.read(_READ_CHUNK_SIZE)
+            # Skip decoding entirely when the head already looks binary
+            if chunk.find(b"\0", 0, _BINARY_SNIFF_SIZE) != -1:
+                is_binary = True
+            
+            while chunk:
+                base64_parts.append(base64.b64encode(chunk))
+                
+                if not is_binary:
                     try:
-                        content_text = content_bytes.decode("utf-8")
-                        is_binary = False
+                        text = decoder.decode(chunk)
                     except UnicodeDecodeError:
-                        content_text = None
                         is_binary = True
-                    
-                    content_base64 = base64.b64encode(content_bytes).decode("ascii")
-                    
-                    # Detect file type
-                    extension = file_path.suffix.lower()
-                    mime_type = self._get_mime_type(extension)
-                    
-                    files.append({
-                        "path": str(relative_path).replace("\\", "/"),
-                        "name": file_path.name,
-                        "extension": extension,
-                        "size": file_size,
-                        "is_binary": is_binary,
-                        "mime_type": mime_type,
-                        "content_base64": content_base64,
-                        "content_text": content_text if not is_binary else None
-                    })
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to read file {file_path}: {e}")
+                    else:
+                        if include_text:
+                            text_parts.append(text)
+                
+                chunk = f.read(_READ_CHUNK_SIZE)
         
-        return files
+        # Flush the decoder: a truncated multi-byte sequence at EOF is binary
+        if not is_binary:
+            try:
+                decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                is_binary = True
+        
+        content_base64 = b"".join(base64_parts).decode("ascii")
+        content_text = "".join(text_parts) if include_text and not is_binary else None
+        return content_base64, content_text, is_binary
     
     def _get_mime_type(self, extension: str) -> str:
         """Get MIME type from file extension."""
-        mime_map = {
-            ".py": "text/x-python",
-            ".js": "text/javascript",
-            ".ts": "text/typescript",
-            ".jsx": "text/jsx",
-            ".tsx": "text/tsx",
-            ".json": "application/json",
-            ".html": "text/html",
-            ".css": "text/css",
-            ".md": "text/markdown",
-            ".txt": "text/plain",
-            ".yaml": "text/yaml",
-            ".yml": "text/yaml",
-            ".xml": "application/xml",
-            ".sh": "text/x-shellscript",
-            ".bash": "text/x-shellscript",
-            ".ps1": "text/x-powershell",
-            ".java": "text/x-java",
-            ".c": "text/x-c",
-            ".cpp": "text/x-c++",
-            ".h": "text/x-c",
-            ".cs": "text/x-csharp",
-            ".go": "text/x-go",
-            ".rs": "text/x-rust",
-            ".rb": "text/x-ruby",
-            ".php": "text/x-php",
-            ".sql": "text/x-sql",
-            ".dockerfile": "text/x-dockerfile",
-            ".gitignore": "text/plain",
-            ".env": "text/plain",
-        }
-        return mime_map.get(extension, "application/octet-stream")
+        return _MIME_MAP.get(extension, "application/octet-stream")
+        
+    def _build_command_args(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        silent: bool = True
+    ) -> List[str]:
+        """Build the non-interactive copilot command line for a prompt."""
+        args = [self._copilot_path, "-p", prompt]
+        
+        # Add model if specified
+        if model:
+            args.extend(["--model", model])
+        elif self._default_model:
+            args.extend(["--model", self._default_model])
+            
+        # Silent mode for cleaner output
+        if silent:
+            args.append("-s")
+            
+        # Allow all tools for non-interactive mode
+        args.append("--allow-all-tools")
         
+        # Disable color for cleaner parsing
+        args.append("--no-color")
+        
+        return args
+    
     async def _run_copilot_command(
         self, 
         prompt: str, 
@@ -232,34 +465,26 @@ class CopilotService:
         Returns:
             Tuple of (stdout, stderr, return_code)
         """
-        args = [self._copilot_path, "-p", prompt]
-        
-        # Add model if specified
-        if model:
-            args.extend(["--model", model])
-        elif self._default_model:
-            args.extend(["--model", self._default_model])
-            
-        # Silent mode for cleaner output
-        if silent:
-            args.append("-s")
-            
-        # Allow all tools for non-interactive mode
-        args.append("--allow-all-tools")
-        
-        # Disable color for cleaner parsing
-        args.append("--no-color")
+        args = self._build_command_args(prompt, model, silent)
         
         try:
-            process = await asyncio.create_subprocess_exec(
-                *args,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=self._get_env(),
-                cwd=workspace_path  # Set working directory
-            )
-            
-            stdout, stderr = await process.communicate()
+            async with self._process_slots or contextlib.nullcontext():
+                process = await asyncio.create_subprocess_exec(
+                    *args,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    env=self._get_env(),
+                    cwd=workspace_path  # Set working directory
+                )
+                
+                try:
+                    stdout, stderr = await process.communicate()
+                finally:
+                    # Cancelled or failed: don't leave the CLI running once
+                    # its slot is released
+                    if process.returncode is None:
+                        process.kill()
+                        await process.wait()
             
             return (
                 stdout.decode("utf-8", errors="replace"),
@@ -268,13 +493,100 @@ class CopilotService:
             )
             
         except FileNotFoundError:
-            raise Exception(
-                "GitHub Copilot CLI not found. Please install it:\n"
-                "- Windows: winget install GitHub.Copilot\n"
-                "- macOS/Linux: brew install copilot-cli\n"
-                "- npm: npm install -g @github/copilot\n"
-                "Then set GH_TOKEN with a PAT that has 'Copilot Requests' permission"
-            )
+            raise Exception(_CLI_NOT_FOUND_MESSAGE)
+    
+    async def _run_copilot_command_stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        silent: bool = True,
+        workspace_path: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Run a copilot command and yield its cleaned output as it is produced.
+        
+        stdout is read incrementally and cleaned line by line with the same
+        _clean_output_line filter as _parse_copilot_output. Whitespace that
+        may turn out to be trailing (line ends, blank lines) is held back
+        until more content follows, so a successful run streams exactly the
+        text chat() would return.
+        
+        If the CLI exits with an error, its stderr is yielded last. Unlike
+        chat(), which returns only stderr in that case, any stdout already
+        streamed has been sent by then and precedes it.
+        
+        Args:
+            prompt: The prompt to send to Copilot
+            model: Model to use (claude-sonnet-4, gpt-5, etc.)
+            silent: Whether to use silent mode (only output response)
+            workspace_path: Working directory for Copilot to create files in
+        """
+        args = self._build_command_args(prompt, model, silent)
+        
+        async with self._process_slots or contextlib.nullcontext():
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *args,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    env=self._get_env(),
+                    cwd=workspace_path  # Set working directory
+                )
+            except FileNotFoundError:
+                raise Exception(_CLI_NOT_FOUND_MESSAGE)
+            
+            # Drain stderr concurrently so a full pipe can't stall the CLI
+            stderr_task = asyncio.ensure_future(process.stderr.read())
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            pending = ""  # incomplete last line
+            held = ""  # blank lines, only emitted if more content follows
+            started = False
+            
+            try:
+                while True:
+                    chunk = await process.stdout.read(_STREAM_READ_SIZE)
+                    final = not chunk
+                    pending += decoder.decode(chunk, final=final)
+                    
+                    lines = pending.split('\n')
+                    pending = '' if final else lines.pop()
+                    
+                    for line in lines:
+                        line = _clean_output_line(line)
+                        if line is None:
+                            continue
+                        
+                        if not line.strip():
+                            if started:
+                                held += '\n' + line
+                            continue
+                        
+                        # Hold the line's trailing whitespace: it is dropped
+                        # if this turns out to be the last line
+                        text = line.rstrip()
+                        if started:
+                            yield held + '\n' + text
+                        else:
+                            yield text.lstrip()
+                            started = True
+                        held = line[len(text):]
+                    
+                    if final:
+                        break
+                
+                code = await process.wait()
+                stderr = (await stderr_task).decode("utf-8", errors="replace")
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                stderr_task.cancel()
+        
+        if code != 0:
+            error_text = stderr.strip() or "Copilot CLI error"
+            yield '\n\n' + error_text if started else error_text
+        elif not started:
+            yield "No response from Copilot"
     
     async def check_copilot_available(self) -> Dict[str, Any]:
         """Check if GitHub Copilot CLI is available and authenticated."""
@@ -322,6 +634,7 @@ class CopilotService:
         messages: List[Dict[str, str]],
         model: str = None,
         keep_workspace: bool = False,
+        include_text: bool = True,
         **kwargs
     ) -> Dict[str, Any]:
         """
@@ -334,12 +647,14 @@ class CopilotService:
             messages: List of message dictionaries with 'role' and 'content'
             model: Model to use (claude-sonnet-4, gpt-5, etc.)
             keep_workspace: If True, don't cleanup workspace (for debugging)
+            include_text: If False, skip UTF-8 content_text for created files
             
         Returns:
             Response with message content and any files created (as base64)
         """
-        # Create temporary workspace for this request
-        workspace_path = self._create_temp_workspace()
+        # Create temporary workspace for this request (filesystem work runs
+        # in a thread so it doesn't stall the event loop)
+        workspace_path = await asyncio.to_thread(self._create_temp_workspace)
         
         try:
             # Build the prompt from messages
@@ -358,7 +673,9 @@ class CopilotService:
                 response_text = self._parse_copilot_output(stdout)
             
             # Scan workspace for any files created
-            files_created = self._scan_workspace_files(workspace_path)
+            files_created = await asyncio.to_thread(
+                self._scan_workspace_files, workspace_path, include_text
+            )
             
             return self._format_response_with_files(
                 prompt=prompt,
@@ -371,7 +688,21 @@ class CopilotService:
         finally:
             # Cleanup workspace unless told to keep it
             if not keep_workspace:
-                self._cleanup_workspace(workspace_path)
+                await asyncio.to_thread(self._cleanup_workspace, workspace_path)
+    
+    async def chat_raw(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        **kwargs
+    ) -> bytes:
+        """
+        Same as chat(), but returns the response already encoded as JSON bytes.
+        
+        Lets callers pass the body straight through (and share it between
+        callers) without re-serializing the response dict.
+        """
+        return orjson.dumps(await self.chat(messages, model=model, **kwargs))
     
     def _build_prompt(self, messages: List[Dict[str, str]]) -> str:
         """Build a single prompt from message history."""
@@ -395,24 +726,19 @@ class CopilotService:
         if not output:
             return "No response from Copilot"
         
-        # Remove ANSI escape codes
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        output = ansi_escape.sub('', output)
-        
-        # Clean up common CLI output patterns
-        lines = output.split('\n')
+        # Clean up common CLI output patterns (ANSI codes, spinner lines)
         cleaned_lines = []
         
-        for line in lines:
-            # Skip spinner/loading lines
-            if any(c in line for c in ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']):
+        for line in output.split('\n'):
+            line = _clean_output_line(line)
+            if line is None:
                 continue
             # Skip empty lines at start
             if not cleaned_lines and not line.strip():
                 continue
             cleaned_lines.append(line)
         
-        return '\n'.join(cleaned_lines).strip()
+        return '\n'.join(cleaned_lines).strip() or "No response from Copilot"
     
     def _format_response_with_files(
         self, 
@@ -423,38 +749,35 @@ class CopilotService:
         workspace_id: str
     ) -> Dict[str, Any]:
         """Format response with files in extended OpenAI-compatible format."""
-        return {
-            "id": f"copilot-{workspace_id}",
-            "object": "chat.completion",
-            "created": int(time.time()),
-            "model": f"github-copilot-{model}",
-            "choices": [{
-                "index": 0,
-                "message": {
-                    "role": "assistant",
-                    "content": response
-                },
-                "finish_reason": "stop"
-            }],
-            "usage": {
-                "prompt_tokens": len(prompt.split()),
-                "completion_tokens": len(response.split()),
-                "total_tokens": len(prompt.split()) + len(response.split())
-            },
-            "files": files,
-            "files_count": len(files),
-            "workspace_id": workspace_id,
-            "copilot_metadata": {
-                "cli_version": "copilot-cli",
-                "model": model,
-                "workspace_used": True
-            }
+        result = self._build_completion(f"copilot-{workspace_id}", prompt, response, model)
+        result["files"] = files
+        result["files_count"] = len(files)
+        result["workspace_id"] = workspace_id
+        result["copilot_metadata"] = {
+            "cli_version": "copilot-cli",
+            "model": model,
+            "workspace_used": True
         }
+        return result
     
     def _format_response(self, prompt: str, response: str, model: str) -> Dict[str, Any]:
         """Format response in OpenAI-compatible format (without files)."""
+        result = self._build_completion(f"copilot-{next(self._response_ids)}", prompt, response, model)
+        result["copilot_metadata"] = {
+            "cli_version": "copilot-cli",
+            "model": model
+        }
+        return result
+    
+    @staticmethod
+    def _build_completion(response_id: str, prompt: str, response: str, model: str) -> Dict[str, Any]:
+        """Build the chat.completion fields shared by both response formats."""
+        # Whitespace word counts, each computed once
+        prompt_tokens = len(prompt.split())
+        completion_tokens = len(response.split())
+        
         return {
-            "id": f"copilot-{hash(prompt) % 10000}",
+            "id": response_id,
             "object": "chat.completion",
             "created": int(time.time()),
             "model": f"github-copilot-{model}",
@@ -467,13 +790,9 @@ class CopilotService:
                 "finish_reason": "stop"
             }],
             "usage": {
-                "prompt_tokens": len(prompt.split()),
-                "completion_tokens": len(response.split()),
-                "total_tokens": len(prompt.split()) + len(response.split())
-            },
-            "copilot_metadata": {
-                "cli_version": "copilot-cli",
-                "model": model
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
             }
         }
     
@@ -481,45 +800,69 @@ class CopilotService:
         self,
         messages: List[Dict[str, str]],
         model: str = None,
+        keep_workspace: bool = False,
+        include_text: bool = True,
         **kwargs
-    ) -> tuple[str, List[Dict[str, Any]]]:
+    ) -> AsyncIterator[bytes]:
         """
-        Stream chat - simulated since CLI doesn't support native streaming.
-        Returns both the stream data and the files created.
+        Stream chat as Server-Sent Events frames.
+        
+        Copilot's output is forwarded as chat.completion.chunk frames while
+        the CLI runs. After the CLI exits, a files frame (if any files were
+        created) and the [DONE] marker follow.
         """
-        response = await self.chat(messages, model=model, **kwargs)
-        
-        content = response["choices"][0]["message"]["content"]
-        files = response.get("files", [])
-        
-        # Simulate streaming by chunking the response
-        chunks = []
-        words = content.split(' ')
-        
-        for i, word in enumerate(words):
-            chunk_data = {
-                "id": response["id"],
-                "object": "chat.completion.chunk",
-                "choices": [{
-                    "index": 0,
-                    "delta": {"content": word + (' ' if i < len(words) - 1 else '')},
-                    "finish_reason": None if i < len(words) - 1 else "stop"
-                }]
-            }
-            chunks.append(f"data: {json.dumps(chunk_data)}\n\n")
-        
-        # Add files at the end of stream
-        if files:
-            files_chunk = {
-                "id": response["id"],
-                "object": "chat.completion.files",
-                "files": files,
-                "files_count": len(files)
-            }
-            chunks.append(f"data: {json.dumps(files_chunk)}\n\n")
+        model = model or self._default_model
+        workspace_path = await asyncio.to_thread(self._create_temp_workspace)
+        response_id = f"copilot-{os.path.basename(workspace_path)}"
+        
+        # Content frames differ only in their text, so the envelope is encoded once
+        chunk_prefix = self._format_stream_chunk_prefix(response_id)
         
-        chunks.append("data: [DONE]\n\n")
-        return "".join(chunks), files
+        try:
+            prompt = self._build_prompt(messages)
+            output = self._run_copilot_command_stream(
+                prompt=prompt,
+                model=model,
+                workspace_path=workspace_path
+            )
+            
+            # aclosing() so a disconnecting client stops the CLI right away
+            async with contextlib.aclosing(output) as stream:
+                async for text in stream:
+                    yield chunk_prefix + orjson.dumps(text) + _CHUNK_SUFFIX
+            
+            yield chunk_prefix + b'""' + _CHUNK_STOP_SUFFIX
+            
+            # Add files at the end of stream
+            files = await asyncio.to_thread(
+                self._scan_workspace_files, workspace_path, include_text
+            )
+            if files:
+                files_chunk = {
+                    "id": response_id,
+                    "object": "chat.completion.files",
+                    "files": files,
+                    "files_count": len(files)
+                }
+                yield b"data: %s\n\n" % orjson.dumps(files_chunk)
+            
+            yield b"data: [DONE]\n\n"
+            
+        finally:
+            # Cleanup workspace unless told to keep it
+            if not keep_workspace:
+                await asyncio.to_thread(self._cleanup_workspace, workspace_path)
+    
+    def _format_stream_chunk_prefix(self, response_id: str) -> bytes:
+        """
+        Encode everything in a chat.completion.chunk SSE frame up to the
+        delta content; a frame is prefix + orjson.dumps(content) + one of
+        the _CHUNK_*_SUFFIX constants.
+        """
+        return (
+            b'data: {"id":' + orjson.dumps(response_id)
+            + b',"object":"chat.completion.chunk","choices":[{"index":0,"delta":{"content":'
+        )
     
     def get_available_models(self) -> List[Dict[str, Any]]:
         """Get list of available models from Copilot CLI."""